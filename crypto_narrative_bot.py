@@ -1,12 +1,17 @@
 import os
 import time
-import json
+import orjson
 from decimal import Decimal
 from dotenv import load_dotenv
 from web3 import Web3
 import requests
+from requests.adapters import HTTPAdapter
 from datetime import datetime
 import random
+import asyncio
+import threading
+import websockets
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables
 load_dotenv(".env")
@@ -16,17 +21,30 @@ ARBITRUM_RPC = os.getenv("ARBITRUM_RPC")
 PRIVATE_KEY = os.getenv("PRIVATE_KEY")
 PUBLIC_ADDRESS = os.getenv("PUBLIC_ADDRESS")
 UNISWAP_ROUTER_ADDRESS = os.getenv("UNISWAP_ROUTER_ADDRESS")
+TELEGRAM_TOKEN = os.getenv("TELEGRAM_BOT_TOKEN")
+TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+TELEGRAM_URL = (
+    f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage"
+    if TELEGRAM_TOKEN and TELEGRAM_CHAT_ID else None
+)
 
 web3 = Web3(Web3.HTTPProvider(ARBITRUM_RPC))
-w3_eth = web3
 wallet = web3.toChecksumAddress(PUBLIC_ADDRESS)
 router = web3.toChecksumAddress(UNISWAP_ROUTER_ADDRESS)
 
+# Shared HTTP session so CoinGecko and Telegram calls reuse pooled connections
+HTTP = requests.Session()
+HTTP.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=8))
+HTTP.headers.update({
+    "User-Agent": "ArbitrumCryptoBot",
+    "Accept-Encoding": "gzip"
+})
+
 # Load ABIs
 def load_abi(file_path):
     try:
-        with open(file_path, "r") as f:
-            abi = json.load(f)
+        with open(file_path, "rb") as f:
+            abi = orjson.loads(f.read())
         if isinstance(abi, list):
             return abi
         else:
@@ -48,11 +66,27 @@ if erc20_abi is None:
 
 # Constants
 START_CAPITAL = Decimal("50")
-TP_PERCENT = Decimal("0.25")
-SL_PERCENT = Decimal("0.05")
-DAILY_TARGET = Decimal("0.20")
+# Trade math runs on ints: USDT amounts and prices in micro-units (6 decimals), rates in basis points
+MICRO = 10**6
+BPS = 10_000
+TP_BPS = 2500
+SL_BPS = 500
+DAILY_TARGET_BPS = 2000
+TRADE_SIZE_BPS = 2000
+MAX_UINT256 = 2**256 - 1
+MAX_TRADES_PER_DAY = 5
+# Fixed EIP-1559 fees skip the eth_gasPrice RPC; 0.2 gwei covers Arbitrum's usual base fee, raise MAX_FEE_PER_GAS (wei) if it spikes
+EIP1559_FEES = {
+    'type': 2,
+    'maxFeePerGas': int(os.getenv("MAX_FEE_PER_GAS", "200000000")),
+    'maxPriorityFeePerGas': 0
+}
+# Arbitrum blocks land every ~250ms, so poll receipts tighter than web3's default
+RECEIPT_POLL_LATENCY = 0.05
+RECEIPT_TIMEOUT = 30
 base_token = web3.toChecksumAddress("0xfd086bc7cd5c481dcc9c85ebe478a1c0b69fcbb9")  # USDT on Arbitrum
 router_contract = web3.eth.contract(address=router, abi=router_abi)
+USDT_CONTRACT = web3.eth.contract(address=base_token, abi=erc20_abi)
 
 # Tokens
 symbol_to_address = {
@@ -60,72 +94,214 @@ symbol_to_address = {
     "MAGIC": "0x539bde0d7dbd336b79148aa742883198bbf60342",
     "GMX": "0xfc5a1a6eb076a2c7ad06ed22c90d7e710e35ad0a"
 }
+checksum_addresses = {symbol: web3.toChecksumAddress(addr) for symbol, addr in symbol_to_address.items()}
+SYMBOLS = tuple(symbol_to_address.keys())
 
-# Get token price from CoinGecko
-def get_token_price(symbol, retries=3):
-    ids = {
-        "ARB": "arbitrum",
-        "MAGIC": "magic",
-        "GMX": "gmx",
-        "USDT": "tether"
-    }
-    token_id = ids.get(symbol)
-    if not token_id:
-        raise ValueError(f"Symbol {symbol} not supported in price fetch.")
+# CoinGecko ids for every symbol we price, fetched together in one request
+COINGECKO_IDS = {
+    "ARB": "arbitrum",
+    "MAGIC": "magic",
+    "GMX": "gmx",
+    "USDT": "tether"
+}
+COINGECKO_PRICE_URL = (
+    "https://api.coingecko.com/api/v3/simple/price"
+    f"?ids={','.join(COINGECKO_IDS.values())}&vs_currencies=usd"
+)
+FALLBACK_PRICES = {
+    "ARB": Decimal("0.75"),
+    "MAGIC": Decimal("0.45"),
+    "GMX": Decimal("30"),
+    "USDT": Decimal("1")
+}
 
+# Get all token prices from CoinGecko in a single request; symbols still missing after retries are left out
+def fetch_all_prices(retries=3):
+    prices = {}
     for attempt in range(retries):
         try:
-            url = f"https://api.coingecko.com/api/v3/simple/price?ids={token_id}&vs_currencies=usd"
-            response = requests.get(url, timeout=5).json()
+            response = HTTP.get(COINGECKO_PRICE_URL, timeout=5).json()
 
-            if token_id not in response:
-                print(f"[{symbol}] Missing token data on attempt {attempt + 1}: {response}")
-                time.sleep(2)
-                continue
+            for symbol, token_id in COINGECKO_IDS.items():
+                if token_id in response:
+                    prices[symbol] = Decimal(str(response[token_id]["usd"]))
 
-            return Decimal(str(response[token_id]["usd"]))
+            missing = [s for s in COINGECKO_IDS if s not in prices]
+            if not missing:
+                return prices
+            print(f"{missing} Missing token data on attempt {attempt + 1}: {response}")
+            time.sleep(2)
 
         except Exception as e:
-            print(f"[{symbol}] CoinGecko fetch error: {e}")
+            print(f"CoinGecko fetch error: {e}")
             time.sleep(2)
 
-    fallback_prices = {
-        "ARB": Decimal("0.75"),
-        "MAGIC": Decimal("0.45"),
-        "GMX": Decimal("30"),
-        "USDT": Decimal("1")
-    }
-    print(f"[{symbol}] Falling back to static price: {fallback_prices[symbol]}")
-    return fallback_prices[symbol]
+    return prices
+
+# CoinGecko edge-caches /simple/price for 20-30s, so polling faster gains nothing
+PRICE_CACHE_TTL = 25
+_price_cache = {}
+
+# Binance ticker stream, kept open in a background thread; CoinGecko covers anything it lacks
+BINANCE_STREAM_SYMBOLS = {
+    "ARBUSDT": "ARB",
+    "MAGICUSDT": "MAGIC",
+    "GMXUSDT": "GMX"
+}
+BINANCE_STREAM_URL = (
+    "wss://stream.binance.com:9443/stream?streams="
+    + "/".join(f"{pair.lower()}@ticker" for pair in BINANCE_STREAM_SYMBOLS)
+)
+STREAM_PRICE_MAX_AGE = 10
+# Reconnects back off exponentially; a geo-block (e.g. HTTP 451) never clears, and CoinGecko covers it meanwhile
+STREAM_RETRY_DELAY = 5
+STREAM_MAX_RETRY_DELAY = 600
+latest_prices = {}
+
+async def _stream_prices():
+    delay = STREAM_RETRY_DELAY
+    logged = False
+    while True:
+        try:
+            async with websockets.connect(BINANCE_STREAM_URL) as ws:
+                delay = STREAM_RETRY_DELAY
+                logged = False
+                async for message in ws:
+                    data = orjson.loads(message).get("data", {})
+                    symbol = BINANCE_STREAM_SYMBOLS.get(data.get("s"))
+                    if symbol:
+                        latest_prices[symbol] = (time.time(), Decimal(data["c"]))
+        except Exception as e:
+            if not logged:
+                print(f"Binance price stream error, using CoinGecko until it reconnects: {e}")
+                logged = True
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, STREAM_MAX_RETRY_DELAY)
+
+def start_price_stream():
+    thread = threading.Thread(target=asyncio.run, args=(_stream_prices(),), daemon=True)
+    thread.start()
+    return thread
+
+# Get token price from the stream, else from the CoinGecko cache while fresh
+def get_token_price(symbol):
+    if symbol not in COINGECKO_IDS:
+        raise ValueError(f"Symbol {symbol} not supported in price fetch.")
+
+    streamed = latest_prices.get(symbol)
+    if streamed and time.time() - streamed[0] < STREAM_PRICE_MAX_AGE:
+        return streamed[1]
+
+    cached = _price_cache.get(symbol)
+    if cached and time.time() - cached[0] < PRICE_CACHE_TTL:
+        return cached[1]
+
+    # Only live quotes are cached, so a static fallback is never served as a fresh price
+    prices = fetch_all_prices()
+    now = time.time()
+    for sym, price in prices.items():
+        _price_cache[sym] = (now, price)
+    if symbol in prices:
+        return prices[symbol]
+
+    print(f"[{symbol}] Falling back to static price: {FALLBACK_PRICES[symbol]}")
+    return FALLBACK_PRICES[symbol]
 
 # Telegram Alerts
+def _send_telegram_alert(msg):
+    try:
+        HTTP.post(TELEGRAM_URL, data={"chat_id": TELEGRAM_CHAT_ID, "text": msg}, timeout=10)
+    except Exception as e:
+        print(f"Telegram alert failed: {e}")
+
+# Alerts are fire-and-forget so they stay off the trade loop's critical path; one worker keeps them in order
+TG_EXEC = ThreadPoolExecutor(max_workers=1)
+
 def send_telegram_alert(msg):
-    token = os.getenv("TELEGRAM_BOT_TOKEN")
-    chat_id = os.getenv("TELEGRAM_CHAT_ID")
-    if token and chat_id:
-        url = f"https://api.telegram.org/bot{token}/sendMessage"
-        requests.post(url, data={"chat_id": chat_id, "text": msg})
+    if TELEGRAM_URL:
+        TG_EXEC.submit(_send_telegram_alert, msg)
+
+# Nonces are handed out locally so several swaps can be in flight at once
+_nonce_lock = threading.Lock()
+_next_nonce = 0
+
+def sync_nonce():
+    global _next_nonce
+    nonce = web3.eth.get_transaction_count(wallet, "pending")
+    with _nonce_lock:
+        _next_nonce = nonce
+
+def allocate_nonce():
+    global _next_nonce
+    with _nonce_lock:
+        nonce = _next_nonce
+        _next_nonce += 1
+    return nonce
 
-# Approve token
+# Burn a nonce whose transaction never went out, so the higher nonces already sent aren't stuck behind it.
+# The send may have failed because the base fee outgrew the fixed cap, so pay at least twice the current gas price.
+def fill_nonce_gap(nonce):
+    try:
+        txn = {
+            'from': wallet,
+            'to': wallet,
+            'value': 0,
+            'nonce': nonce,
+            'gas': 100000,  # Arbitrum gas limits include the L1 data cost, so 21000 is too low
+            'chainId': web3.eth.chain_id,
+            **EIP1559_FEES,
+            'maxFeePerGas': max(EIP1559_FEES['maxFeePerGas'], 2 * web3.eth.gas_price)
+        }
+        signed = web3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
+        web3.eth.sendRawTransaction(signed.rawTransaction)
+        print(f"Filled nonce {nonce} with a 0-value self-transfer")
+    except Exception as e:
+        print(f"Failed to fill nonce gap at {nonce}: {e}")
+
+# Approve token without waiting for it to be mined
 def approve_token(token, spender, amount):
-    contract = web3.eth.contract(address=token, abi=erc20_abi)
-    nonce = web3.eth.getTransactionCount(wallet)
-    txn = contract.functions.approve(spender, amount).buildTransaction({
+    contract = USDT_CONTRACT if token == base_token else web3.eth.contract(address=token, abi=erc20_abi)
+    nonce = allocate_nonce()
+    try:
+        txn = contract.functions.approve(spender, amount).build_transaction({
+            'from': wallet,
+            'nonce': nonce,
+            'gas': 200000,
+            **EIP1559_FEES
+        })
+        signed = web3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
+        return web3.eth.sendRawTransaction(signed.rawTransaction)
+    except Exception:
+        fill_nonce_gap(nonce)
+        raise
+
+# Approve the router for unlimited USDT unless it already is. A finite allowance is topped up rather than
+# compared to the next trade, because swaps still in flight will spend it after we read it.
+def ensure_allowance():
+    if USDT_CONTRACT.functions.allowance(wallet, router).call() >= MAX_UINT256 // 2:
+        return None
+    return approve_token(base_token, router, MAX_UINT256)
+
+def wait_for_receipt(tx_hash):
+    return web3.eth.wait_for_transaction_receipt(
+        tx_hash, timeout=RECEIPT_TIMEOUT, poll_latency=RECEIPT_POLL_LATENCY
+    )
+
+# Sign and broadcast a swap, returning its tx hash
+def send_swap(params, nonce):
+    tx = router_contract.functions.exactInputSingle(params).build_transaction({
         'from': wallet,
         'nonce': nonce,
-        'gas': 200000,
-        'gasPrice': web3.eth.gas_price()
-
+        'gas': 400000,
+        'value': 0,
+        **EIP1559_FEES
     })
-    signed = web3.eth.account.sign_transaction(txn, private_key=PRIVATE_KEY)
-    tx_hash = web3.eth.sendRawTransaction(signed.rawTransaction)
-    web3.eth.wait_for_transaction_receipt(tx_hash)
+    signed_tx = web3.eth.account.sign_transaction(tx, PRIVATE_KEY)
+    return web3.eth.sendRawTransaction(signed_tx.rawTransaction)
 
-# Execute real swap
-def execute_trade(token_symbol, amount_usdt):
-    token = web3.toChecksumAddress(symbol_to_address[token_symbol])
-    amount_in = int(amount_usdt * Decimal('1e6'))
-    approve_token(base_token, router, amount_in)
+# Execute real swap; it goes out right behind any pending approve, whose lower nonce always lands first
+def execute_trade(token_symbol, amount_in, nonce, approve_hash=None):
+    token = checksum_addresses[token_symbol]
 
     params = {
         'tokenIn': base_token,
@@ -138,55 +314,147 @@ def execute_trade(token_symbol, amount_usdt):
         'sqrtPriceLimitX96': 0
     }
 
-    tx = router_contract.functions.exactInputSingle(params).build_transaction({
-        'from': wallet,
-        'nonce': web3.eth.getTransactionCount(wallet),
-        'gas': 400000,
-        'gasPrice': web3.eth.gas_price(),
-        'value': 0
-    })
-    signed_tx = web3.eth.account.sign_transaction(tx, PRIVATE_KEY)
-    tx_hash = web3.eth.sendRawTransaction(signed.rawTransaction)
-    receipt = web3.eth.wait_for_transaction_receipt(tx_hash)
+    try:
+        tx_hash = send_swap(params, nonce)
+    except Exception:
+        fill_nonce_gap(nonce)  # nothing was broadcast, so burn the nonce
+        raise
+
+    receipt = wait_for_receipt(tx_hash)
+    if receipt["status"] == 0:
+        if approve_hash is not None and wait_for_receipt(approve_hash)["status"] == 0:
+            print(f"[{token_symbol}] Approve {approve_hash.hex()} reverted, so the swap had no allowance")
+        print(f"[{token_symbol}] Swap reverted: {tx_hash.hex()}")
     return receipt
 
-# Trade loop
+def to_micro(amount):
+    return int(amount * MICRO)
+
+def from_micro(amount_micro):
+    return Decimal(amount_micro) / MICRO
+
+# Capital after the last trade booked this run, so a failed run can still persist its progress
+booked_capital = None
+
+# Trade loop; swaps run on worker threads so the next trade doesn't wait for the last receipt
 def run_daily_trade(capital):
-    earned_today = Decimal("0")
-    trades_today = 0
-    goal = capital * DAILY_TARGET
+    global booked_capital
+    booked_capital = None
+    capital_micro = to_micro(capital)
+    earned_micro = 0
+    goal_micro = capital_micro * DAILY_TARGET_BPS // BPS
+    sync_nonce()
+    allowance_ready = False
+    approve_hash = None
+    swaps = []
 
-    while earned_today < goal and trades_today < 5:
-        symbol = random.choice(list(symbol_to_address.keys()))
-        trade_amt = min(capital * Decimal("0.2"), capital)
-        try:
-            entry_price = get_token_price(symbol)
-        except ValueError:
-            continue  # Skip token if price fetch fails
+    # Draw the whole day's tokens and outcomes up front
+    symbol_picks = random.choices(SYMBOLS, k=MAX_TRADES_PER_DAY)
+    outcome_picks = random.choices(["TP", "SL"], weights=[0.65, 0.35], k=MAX_TRADES_PER_DAY)
+
+    with ThreadPoolExecutor(max_workers=MAX_TRADES_PER_DAY + 1) as pool:
+        for symbol, result in zip(symbol_picks, outcome_picks):
+            if earned_micro >= goal_micro:
+                break
+            trade_amt_micro = min(capital_micro * TRADE_SIZE_BPS // BPS, capital_micro)
 
-        tp = entry_price * (1 + TP_PERCENT)
-        sl = entry_price * (1 - SL_PERCENT)
+            # Price lookup and approval are independent, so overlap them
+            price_future = pool.submit(get_token_price, symbol)
+            if not allowance_ready:
+                try:
+                    approve_hash = ensure_allowance()
+                    allowance_ready = True
+                except Exception as e:
+                    print(f"[{symbol}] Approve failed, skipping trade: {e}")
+                    continue
+            try:
+                entry_price = price_future.result()
+            except ValueError:
+                continue  # Skip token if price fetch fails
 
-        send_telegram_alert(f"🚀 Buying {symbol} with ${trade_amt:.2f} USDT at ${entry_price:.2f}")
-        receipt = execute_trade(symbol, trade_amt)
-        time.sleep(1)
+            entry_micro = to_micro(entry_price)
+            tp_micro = entry_micro * (BPS + TP_BPS) // BPS
+            sl_micro = entry_micro * (BPS - SL_BPS) // BPS
 
-        result = random.choices(["TP", "SL"], weights=[0.65, 0.35])[0]
-        profit = (tp - entry_price if result == "TP" else sl - entry_price) * trade_amt / entry_price
-        capital += profit
-        earned_today += max(profit, Decimal("0"))
-        trades_today += 1
+            send_telegram_alert(f"🚀 Buying {symbol} with ${from_micro(trade_amt_micro):.2f} USDT at ${entry_price:.2f}")
+            swaps.append((symbol, pool.submit(execute_trade, symbol, trade_amt_micro, allocate_nonce(), approve_hash)))
+            time.sleep(1)
 
-        send_telegram_alert(f"📈 {symbol} {result}, Profit: ${profit:.2f}, Capital: ${capital:.2f}")
+            exit_micro = tp_micro if result == "TP" else sl_micro
+            profit_micro = (exit_micro - entry_micro) * trade_amt_micro // entry_micro
+            capital_micro += profit_micro
+            earned_micro += max(profit_micro, 0)
+            booked_capital = from_micro(capital_micro)
 
-    return capital
+            send_telegram_alert(
+                f"📈 {symbol} {result}, Profit: ${from_micro(profit_micro):.2f}, Capital: ${from_micro(capital_micro):.2f}"
+            )
+
+        # Trades are already booked, so a failed swap is logged rather than aborting the run
+        for symbol, swap in swaps:
+            try:
+                swap.result()
+            except Exception as e:
+                print(f"[{symbol}] Swap failed: {e}")
+
+    return from_micro(capital_micro)
+
+# Capital state; written to a temp file and renamed so a crash never leaves a half-written file
+CAPITAL_FILE = "capital_live.json"
+
+def load_capital():
+    try:
+        with open(CAPITAL_FILE, "rb") as f:
+            return Decimal(orjson.loads(f.read())["capital"])
+    except FileNotFoundError:
+        return START_CAPITAL
+    except Exception as e:
+        print(f"Error loading capital from {CAPITAL_FILE}: {e}")
+        return START_CAPITAL
+
+def save_capital(capital):
+    tmp_path = f"{CAPITAL_FILE}.tmp"
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(orjson.dumps({"capital": str(capital)}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, CAPITAL_FILE)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    # fsync the directory too, or the rename itself may not survive a crash
+    dir_fd = os.open(os.path.dirname(os.path.abspath(CAPITAL_FILE)), os.O_RDONLY)
+    try:
+        os.fsync(dir_fd)
+    finally:
+        os.close(dir_fd)
 
 # Run
 if __name__ == "__main__":
     print("\n=== Running Final Arbitrum Bot ===")
-    capital = START_CAPITAL if os.getenv("RESET") == "1" else Decimal(os.getenv("CAPITAL", "50"))
-    capital = run_daily_trade(capital)
+    start_price_stream()
+    if os.getenv("RESET") == "1":
+        capital = START_CAPITAL
+    elif os.getenv("CAPITAL"):
+        capital = Decimal(os.getenv("CAPITAL"))
+    else:
+        capital = load_capital()
+    try:
+        capital = run_daily_trade(capital)
+    except BaseException:
+        # Keep the trades booked before the failure; untouched runs leave the saved file alone
+        if booked_capital is not None:
+            try:
+                save_capital(booked_capital)
+            except Exception as e:
+                print(f"Error saving capital to {CAPITAL_FILE}: {e}")
+        raise
+    save_capital(capital)
 
     # Output for Railway logs or GitHub Actions
     print(f"::set-output name=capital::{capital:.2f}")
+    TG_EXEC.shutdown(wait=True)
     print("\n✅ Done")